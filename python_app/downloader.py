@@ -7,24 +7,97 @@ Also supports video streaming sites via yt-dlp
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sys
 import threading
 import time
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from dataclasses import dataclass, field, fields
 import hashlib
+import functools
+import bisect
 import subprocess
+import signal
+import locale
 import re
-from urllib.parse import urlparse
+
+# Optional HTTP/2 backend: lets all segments of a download share one
+# multiplexed connection when the server supports it
+try:
+    import httpx
+    import h2  # noqa: F401  (required by httpx for HTTP/2)
+except ImportError:
+    httpx = None
+
+# Optional libcurl backend: runs the whole receive-and-write loop of a
+# segment in C instead of iterating over chunks in Python
+try:
+    import pycurl
+except ImportError:
+    pycurl = None
+
+# Largest single read from an HTTP response stream. Larger reads mean fewer
+# Python-level iterations and write calls per byte downloaded. Reads return as
+# soon as any data has arrived, so a slow link is not held up by the size.
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Starting size of one segment. Segments much smaller than this spend most of
+# their time in TCP slow-start instead of at full speed. SegmentTuner adjusts
+# the size from there based on measured throughput.
+TARGET_SEGMENT_SIZE = 4 * 1024 * 1024
+
+# A running segment with at least this much left is split in two once no
+# unassigned bytes remain, so one slow connection cannot hold up the end.
+STEAL_MIN_SIZE = 2 * 1024 * 1024
+
+# How often downloads report progress (seconds), also in nanoseconds for
+# the integer clock checks in the single-stream read loop
+PROGRESS_INTERVAL = 0.5
+PROGRESS_INTERVAL_NS = int(PROGRESS_INTERVAL * 1e9)
+
+# Transient failures retried with exponential backoff. The requests session
+# gets these through urllib3's Retry; the libcurl and HTTP/2 segment paths
+# apply the same policy themselves.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.3
+
+# Buffer size for output files. Coalesces many chunk writes into a few large
+# disk writes. Raised to the filesystem's preferred block size where that is
+# larger (see _write_buffer_size).
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Regexes for yt-dlp progress lines and filename cleanup, compiled once
+_PERCENT_RE = re.compile(r'(\d+(?:\.\d+)?)%')
+_SIZE_RE = re.compile(r'of\s+(\d+(?:\.\d+)?[KMGT]i?B)')
+_SPEED_RE = re.compile(r'at\s+(\d+(?:\.\d+)?\w+/s)')
+_CTRL_RE = re.compile(r'[\x00-\x1f]')
+
+# Headers sent with every plain HTTP request. Asking for the identity encoding
+# keeps Content-Length and byte ranges referring to the stored file bytes
+# instead of a compressed representation.
+_DEFAULT_HEADERS = {
+    'User-Agent': 'MyDM/1.0',
+    'Accept': '*/*',
+    'Accept-Encoding': 'identity'
+}
+
+# Size unit multipliers, keyed on the unit's first letter (KiB and KB alike)
+_UNIT_MULT = {'B': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+
+# Characters not allowed in filenames, mapped to '_'
+_INVALID_TRANS = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
 
 # --------- Utilities ---------
 
 def sanitize_filename(name: str) -> str:
     try:
-        invalid = set('<>:"/\\|?*')
-        safe = ''.join('_' if c in invalid else c for c in name)
-        safe = re.sub(r'[\x00-\x1f]', '', safe)
+        safe = name.translate(_INVALID_TRANS)
+        safe = _CTRL_RE.sub('', safe)
         safe = safe.strip().rstrip('. ')
         if not safe:
             safe = 'download'
@@ -35,11 +108,107 @@ def sanitize_filename(name: str) -> str:
     except Exception:
         return 'download'
 
+def _format_speed(speed_bytes):
+    """Format a speed in bytes per second for display"""
+    if speed_bytes < 1024:
+        return f"{speed_bytes:.1f} B/s"
+    elif speed_bytes < 1024 * 1024:
+        return f"{speed_bytes / 1024:.1f} KB/s"
+    else:
+        return f"{speed_bytes / (1024 * 1024):.1f} MB/s"
+
+@functools.lru_cache(maxsize=16)
+def _write_buffer_size(directory):
+    """
+    Output buffer size for files in directory: WRITE_BUFFER_SIZE, or the
+    filesystem's preferred I/O size (st_blksize) if that is larger, as on
+    some network and parallel filesystems. Cached per directory.
+    """
+    try:
+        blksize = getattr(os.stat(directory), 'st_blksize', 0)
+    except OSError:
+        blksize = 0
+    if blksize <= WRITE_BUFFER_SIZE:
+        return WRITE_BUFFER_SIZE
+    return blksize
+
+def _retry_delay(attempt):
+    """Seconds to wait before retry number attempt (1-based)"""
+    return RETRY_BACKOFF * (2 ** (attempt - 1))
+
+def _drop_cached(f, offset, length):
+    """
+    Tell the kernel the written range of f will not be read back soon, so a
+    large download does not push more useful pages out of the page cache.
+    Only a hint: a no-op where posix_fadvise is unavailable (e.g. Windows).
+    """
+    if length <= 0 or not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        # Dirty pages cannot be dropped; flushing starts their writeback first
+        f.flush()
+        os.posix_fadvise(f.fileno(), offset, length, os.POSIX_FADV_DONTNEED)
+    except (OSError, ValueError):
+        pass
+
+def _iter_body(raw, size=READ_CHUNK_SIZE):
+    """
+    Yield a urllib3 response body in reads of up to size bytes. read1 returns
+    whatever has arrived instead of waiting for a full read, so pause/cancel
+    and progress stay responsive however large size is.
+    """
+    raw.decode_content = True
+    if not hasattr(raw, 'read1'):
+        # urllib3 1.x has no read1 and its reads wait for the full amount
+        yield from _iter_readinto(raw, min(size, 256 * 1024))
+        return
+    while True:
+        chunk = raw.read1(size)
+        if not chunk:
+            break
+        yield chunk
+
+def _iter_readinto(raw, size):
+    """
+    Read a urllib3 response body into one reused buffer instead of a new
+    bytes object per chunk. Yielded views are only valid until the next
+    iteration, so they must be consumed (written) immediately.
+    """
+    view = memoryview(bytearray(size))
+    while True:
+        n = raw.readinto(view)
+        if not n:
+            break
+        yield view[:n]
+
+class _YtDlpLogger:
+    """Collects yt-dlp's messages instead of letting it print them"""
+
+    def __init__(self):
+        self.errors = deque(maxlen=40)
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        self.errors.append(msg)
+
+
+class _YtDlpTimeout(Exception):
+    """Raised from a progress hook to abort an in-process download that ran too long"""
+
+
 class StreamingDownloadManager:
     """Handles downloads from video streaming platforms using yt-dlp"""
 
     # Supported streaming platforms
-    STREAMING_DOMAINS = {
+    STREAMING_DOMAINS = frozenset({
         'youtube.com', 'youtu.be', 'm.youtube.com',
         'vimeo.com', 'player.vimeo.com',
         'tiktok.com', 'vm.tiktok.com', 'm.tiktok.com',
@@ -51,7 +220,7 @@ class StreamingDownloadManager:
         'twitch.tv', 'm.twitch.tv',
         'soundcloud.com',
         'bilibili.com', 'b23.tv'
-    }
+    })
 
     def __init__(self, download_dir=None):
         """Initialize streaming downloader"""
@@ -60,6 +229,11 @@ class StreamingDownloadManager:
         
         # yt-dlp availability will be checked lazily when needed
         self.yt_dlp_available = None
+        self._youtube_dl = None  # yt_dlp.YoutubeDL once the module has been imported
+
+        # Neither changes while the host is running, so work them out once
+        self._cmd_prefix_cache = None
+        self._cookie_sources_cache = None
 
     def _check_yt_dlp(self):
         """Check if yt-dlp is installed and accessible (lazy check)"""
@@ -71,7 +245,9 @@ class StreamingDownloadManager:
 
         # Fast path: module import check (no subprocess)
         try:
-            import yt_dlp  # noqa: F401
+            from yt_dlp import YoutubeDL
+            self._youtube_dl = YoutubeDL
+            self._cmd_prefix_cache = [sys.executable, '-m', 'yt_dlp']
             self.yt_dlp_available = True
             return True
         except Exception:
@@ -86,6 +262,7 @@ class StreamingDownloadManager:
                 timeout=10
             )
             if result.returncode == 0:
+                self._cmd_prefix_cache = [sys.executable, '-m', 'yt_dlp']
                 self.yt_dlp_available = True
                 return True
         except (subprocess.TimeoutExpired, FileNotFoundError):
@@ -95,6 +272,8 @@ class StreamingDownloadManager:
             # Fallback to the yt-dlp executable if present on PATH.
             result = subprocess.run(['yt-dlp', '--version'], capture_output=True, text=True, timeout=10)
             if result.returncode == 0:
+                # Only the executable works, so commands must run it directly
+                self._cmd_prefix_cache = ['yt-dlp']
                 self.yt_dlp_available = True
                 return True
             return False
@@ -103,9 +282,13 @@ class StreamingDownloadManager:
 
     def _yt_dlp_cmd(self):
         """Return a command prefix to run yt-dlp reliably."""
-        # If installed in the same environment, `python -m yt_dlp` is the most reliable.
+        if self._cmd_prefix_cache is not None:
+            return self._cmd_prefix_cache
+        # _check_yt_dlp records the prefix of whichever probe succeeded:
+        # `python -m yt_dlp` when installed in this environment, else the
+        # yt-dlp executable on PATH
         if self._check_yt_dlp():
-            return [sys.executable, '-m', 'yt_dlp']
+            return self._cmd_prefix_cache
         return ['yt-dlp']
 
     def _find_cookie_file(self):
@@ -134,6 +317,8 @@ class StreamingDownloadManager:
 
     def _detect_cookie_sources(self):
         """Return a list of possible --cookies-from-browser sources based on installed browsers and profiles"""
+        if self._cookie_sources_cache is not None:
+            return self._cookie_sources_cache
         sources = []
         try:
             home = Path.home()
@@ -161,15 +346,61 @@ class StreamingDownloadManager:
             if s not in seen:
                 seen.add(s)
                 out.append(s)
+        self._cookie_sources_cache = out
         return out
 
+    @staticmethod
+    def _output_lines(process):
+        """
+        Yield lines of process output, reading the pipe in large blocks
+        instead of one line at a time
+        """
+        encoding = locale.getpreferredencoding(False)
+        fd = process.stdout.fileno()
+        pending = b''
+        while True:
+            block = os.read(fd, 65536)
+            if not block:
+                break
+            lines = (pending + block).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line.decode(encoding, errors='replace')
+        if pending:
+            yield pending.decode(encoding, errors='replace')
+
+    @staticmethod
+    def _kill_process(process):
+        """Kill a yt-dlp process together with any children it started"""
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except OSError:
+            pass
+
     @classmethod
     def is_streaming_site(cls, url):
         """Check if URL is from a supported streaming platform"""
         try:
-            parsed = urlparse(url)
-            domain = parsed.netloc.lower()
-            
+            # Slice out the host directly; this runs for every URL the host sees
+            start = url.find('://')
+            if start < 0:
+                return False
+            start += 3
+            end = len(url)
+            for sep in '/?#':
+                pos = url.find(sep, start)
+                if 0 <= pos < end:
+                    end = pos
+            domain = url[start:end].lower()
+
+            # Drop a :port suffix
+            colon = domain.rfind(':')
+            if colon >= 0:
+                domain = domain[:colon]
+
             # Remove www. prefix if present
             if domain.startswith('www.'):
                 domain = domain[4:]
@@ -180,7 +411,7 @@ class StreamingDownloadManager:
 
     def download(self, url, on_progress=None, on_complete=None, on_error=None):
         """Download from streaming site using yt-dlp with cookie fallbacks"""
-        download_id = hashlib.md5(url.encode()).hexdigest()[:12]
+        download_id = hashlib.blake2b(url.encode(), digest_size=6).hexdigest()
         
         # Check yt-dlp availability (lazy check)
         if not self._check_yt_dlp():
@@ -193,24 +424,10 @@ class StreamingDownloadManager:
                 on_error(download_id, error_msg)
             return None
 
-        def build_cmd(cookies_arg=None):
-            base = [
-                *self._yt_dlp_cmd(),
-                '--no-warnings',
-                '--progress',
-                '--newline',
-                '--no-playlist',  # Force single video extraction (prevents downloading whole playlists)
-                '--socket-timeout', '30',  # 30 second socket timeout
-                '--extractor-args', 'youtube:player_client=web',  # Use web client to bypass age-gate
-                '--extractor-args', 'youtube:skip=dash,hls',  # Skip problematic formats
-                '-f', 'b[ext=mp4]/best[ext=mp4]/best',  # Flexible format selection
-                '--skip-unavailable-fragments',  # Skip unavailable fragments
-                '-o', str(self.download_dir / '%(title)s.%(ext)s')
-            ]
-            if cookies_arg:
-                base.extend(['--cookies-from-browser', cookies_arg])
-            base.append(url)
-            return base
+        # The in-process API avoids starting a new interpreter for every attempt and
+        # reports progress as numbers. The command line remains the fallback for a
+        # yt-dlp that is only available as an executable.
+        run_attempt = self._run_api_attempt if self._youtube_dl is not None else self._run_cli_attempt
 
         # Try multiple cookie sources then fallback to no cookies
         cookie_sources = self._detect_cookie_sources()
@@ -221,107 +438,20 @@ class StreamingDownloadManager:
         last_error_text = ''
 
         for attempt_num, cookies in enumerate(attempts):
-            try:
-                cmd = build_cmd(cookies)
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    universal_newlines=True
-                )
-            except Exception as e:
-                last_error_text = str(e)
-                continue
-
-            filename = "video.mp4"  # Default name
-            total_size = 0
-            downloaded_size = 0
-            last_progress_time = 0
-            min_progress_interval = 0.5  # Only report progress every 500ms max
-            recent_output = []
-
-            # Monitor progress (yt-dlp progress is typically written to stderr, so we merge stderr->stdout above)
-            for line in process.stdout:
-                line = line.strip()
-                if not line:
-                    continue
-
-                # Keep a short tail for error reporting
-                if len(recent_output) >= 80:
-                    recent_output.pop(0)
-                recent_output.append(line)
-
-                # Extract filename from destination line first
-                if '[download]' in line and 'Destination:' in line:
-                    try:
-                        filename = line.split('Destination:')[1].strip()
-                        filename = filename.split()[0] if filename else "video.mp4"
-                    except:
-                        pass
-
-                # Parse progress information
-                if '[download]' in line and '%' in line:
-                    try:
-                        # Extract percentage
-                        percent_match = re.search(r'(\d+(?:\.\d+)?)%', line)
-                        if percent_match:
-                            percent = float(percent_match.group(1))
-                        else:
-                            percent = 0
-
-                        # Extract size information if available
-                        size_match = re.search(r'of\s+(\d+(?:\.\d+)?[KMGT]i?B)', line)
-                        if size_match:
-                            size_str = size_match.group(1)
-                            total_size = self._parse_size(size_str)
-                            downloaded_size = int((percent / 100) * total_size) if total_size > 0 else 0
+            result = run_attempt(url, download_id, on_progress, cookies_from_browser=cookies)
 
-                        # Calculate speed
-                        speed = "N/A"
-                        speed_match = re.search(r'at\s+(\d+(?:\.\d+)?\w+/s)', line)
-                        if speed_match:
-                            speed = speed_match.group(1)
-
-                        # Throttle progress updates
-                        current_time = time.time()
-                        if on_progress and (current_time - last_progress_time) >= min_progress_interval:
-                            on_progress(
-                                download_id,
-                                filename,
-                                min(100, max(0, percent)),
-                                speed,
-                                total_size,
-                                downloaded_size
-                            )
-                            last_progress_time = current_time
-                    except Exception as e:
-                        continue  # Skip malformed progress lines
-
-            # Wait for process to complete with timeout
-            try:
-                process.wait(timeout=3600)
-            except subprocess.TimeoutExpired:
-                process.kill()
+            if result['timeout']:
                 if on_error:
                     on_error(download_id, "Download timeout - took more than 1 hour")
                 return None
 
-            if process.returncode == 0:
-                time.sleep(1)
+            if result['success']:
                 if on_complete:
-                    output_file = self._find_downloaded_file(filename)
-                    on_complete(download_id, filename, output_file)
+                    on_complete(download_id, result['filename'], result['output_file'])
                 return download_id
             else:
-                stderr_output = "\n".join(recent_output[-40:])
+                last_error_text = result['error']
 
-                # Log detailed error info
-                cookies_str = f"cookies={cookies}" if cookies else "no-cookies"
-                error_detail = f"Attempt {attempt_num + 1} failed ({cookies_str}): {stderr_output[:200]}"
-                
-                last_error_text = stderr_output or f"Return code {process.returncode}"
-                
                 # If cookie-related error when using a browser cookie source, try next
                 if cookies and (
                     'cookies database' in last_error_text.lower() or
@@ -347,71 +477,19 @@ class StreamingDownloadManager:
             cookie_file = self._find_cookie_file()
         
         if cookie_file:
-            try:
-                cmd = [
-                    *self._yt_dlp_cmd(), '--no-warnings', '--progress', '--newline',
-                    '--no-playlist',
-                    '--socket-timeout', '30',
-                    '--extractor-args', 'youtube:player_client=web',  # Bypass age-gate
-                    '-f', 'b[ext=mp4]/best[ext=mp4]/best',  # Flexible format
-                    '--skip-unavailable-fragments',
-                    '--cookies', cookie_file,
-                    '-o', str(self.download_dir / '%(title)s.%(ext)s'),
-                    url
-                ]
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    universal_newlines=True
-                )
-                
-                last_progress_time = 0
-                min_progress_interval = 0.5
-                recent_output = []
-                
-                # Monitor progress
-                for line in process.stdout:
-                    line = line.strip()
-                    if not line:
-                        continue
+            result = run_attempt(url, download_id, on_progress, cookie_file=cookie_file)
 
-                    if len(recent_output) >= 80:
-                        recent_output.pop(0)
-                    recent_output.append(line)
-                    
-                    if '[download]' in line and '%' in line:
-                        try:
-                            percent_match = re.search(r'(\d+(?:\.\d+)?)%', line)
-                            if percent_match:
-                                percent = float(percent_match.group(1))
-                                current_time = time.time()
-                                if on_progress and (current_time - last_progress_time) >= min_progress_interval:
-                                    on_progress(download_id, 'video', min(100, max(0, percent)), 'N/A', 0, 0)
-                                    last_progress_time = current_time
-                        except:
-                            pass
-                
-                try:
-                    process.wait(timeout=3600)
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    if on_error:
-                        on_error(download_id, "Download timeout - took more than 1 hour")
-                    return None
-                
-                if process.returncode == 0:
-                    if on_complete:
-                        output_file = self._find_downloaded_file('video.mp4')
-                        on_complete(download_id, 'video', output_file)
-                    return download_id
-                else:
-                    stderr_output = "\n".join(recent_output[-40:])
-                    if stderr_output:
-                        last_error_text = stderr_output[:500]
-            except Exception as e:
-                last_error_text = str(e)
+            if result['timeout']:
+                if on_error:
+                    on_error(download_id, "Download timeout - took more than 1 hour")
+                return None
+
+            if result['success']:
+                if on_complete:
+                    on_complete(download_id, result['filename'], result['output_file'])
+                return download_id
+            elif result['error']:
+                last_error_text = result['error'][:500]
 
         # If we reach here, all attempts failed
         # Build a user-friendly error message
@@ -445,26 +523,234 @@ class StreamingDownloadManager:
         return None
 
 
-    def _parse_size(self, size_str):
-        """Parse size string like '10.5MiB' to bytes"""
+    def _run_api_attempt(self, url, download_id, on_progress, cookies_from_browser=None, cookie_file=None):
+        """
+        Run one yt-dlp download attempt in this process through the YoutubeDL API
+
+        Returns:
+            dict: {success, timeout, filename, output_file, error}
+        """
+        deadline = time.monotonic() + 3600
+        next_report_at = 0.0
+        min_progress_interval = 0.5  # Only report progress every 500ms max
+
+        def on_hook(d):
+            nonlocal next_report_at
+            current_time = time.monotonic()
+            # Raising from a hook aborts the download, like killing the process did
+            if current_time > deadline:
+                raise _YtDlpTimeout()
+            if d.get('status') != 'downloading' or not on_progress or current_time < next_report_at:
+                return
+            next_report_at = current_time + min_progress_interval
+            try:
+                downloaded = d.get('downloaded_bytes') or 0
+                total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+                percent = (downloaded / total) * 100 if total else 0
+                speed = d.get('speed')
+                on_progress(
+                    download_id,
+                    os.path.basename(d.get('filename') or 'video.mp4'),
+                    min(100, max(0, percent)),
+                    _format_speed(speed) if speed else 'N/A',
+                    int(total),
+                    downloaded
+                )
+            except Exception:
+                pass  # A failing progress callback must not abort the download
+
+        logger = _YtDlpLogger()
+        opts = {
+            'outtmpl': str(self.download_dir / '%(title)s.%(ext)s'),
+            'format': 'b[ext=mp4]/best[ext=mp4]/best',  # Flexible format selection
+            'noplaylist': True,  # Force single video extraction (prevents downloading whole playlists)
+            'socket_timeout': 30,
+            # Use web client to bypass age-gate and skip problematic formats
+            'extractor_args': {'youtube': {'player_client': ['web'], 'skip': ['dash', 'hls']}},
+            'skip_unavailable_fragments': True,
+            'progress_hooks': [on_hook],
+            # stdout is the native messaging channel, so nothing may be printed there
+            'logger': logger,
+            'noprogress': True,
+        }
+        if cookies_from_browser:
+            browser, _, profile = cookies_from_browser.partition(':')
+            opts['cookiesfrombrowser'] = (browser, profile or None)
+        if cookie_file:
+            opts['cookiefile'] = cookie_file
+
+        try:
+            with self._youtube_dl(opts) as ydl:
+                info = ydl.extract_info(url, download=True)
+                downloads = info.get('requested_downloads') or [{}]
+                output_file = downloads[0].get('filepath') or ydl.prepare_filename(info)
+        except _YtDlpTimeout:
+            return {'success': False, 'timeout': True, 'filename': None, 'output_file': None, 'error': None}
+        except Exception as e:
+            error = "\n".join(logger.errors) or str(e)
+            return {'success': False, 'timeout': False, 'filename': None, 'output_file': None, 'error': error}
+
+        return {
+            'success': True,
+            'timeout': False,
+            'filename': os.path.basename(output_file),
+            'output_file': output_file,
+            'error': None
+        }
+
+    def _run_cli_attempt(self, url, download_id, on_progress, cookies_from_browser=None, cookie_file=None):
+        """
+        Run one yt-dlp download attempt as a subprocess, parsing its progress output
+
+        Returns:
+            dict: {success, timeout, filename, output_file, error}
+        """
+        cmd = [
+            *self._yt_dlp_cmd(),
+            '--no-warnings',
+            '--progress',
+            '--newline',
+            '--no-playlist',  # Force single video extraction (prevents downloading whole playlists)
+            '--socket-timeout', '30',  # 30 second socket timeout
+            '--extractor-args', 'youtube:player_client=web',  # Use web client to bypass age-gate
+            '--extractor-args', 'youtube:skip=dash,hls',  # Skip problematic formats
+            '-f', 'b[ext=mp4]/best[ext=mp4]/best',  # Flexible format selection
+            '--skip-unavailable-fragments',  # Skip unavailable fragments
+            '-o', str(self.download_dir / '%(title)s.%(ext)s')
+        ]
+        if cookies_from_browser:
+            cmd.extend(['--cookies-from-browser', cookies_from_browser])
+        if cookie_file:
+            cmd.extend(['--cookies', cookie_file])
+        cmd.append(url)
+
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=0,
+                # Own process group, so a timeout also stops ffmpeg and other children
+                start_new_session=True
+            )
+        except Exception as e:
+            return {'success': False, 'timeout': False, 'filename': None, 'output_file': None, 'error': str(e)}
+
+        filename = "video.mp4"  # Default name
+        total_size = 0
+        downloaded_size = 0
+        next_report_at = 0.0
+        min_progress_interval = 0.5  # Only report progress every 500ms max
+        recent_output = deque(maxlen=80)
+
+        # The output loop blocks in os.read until yt-dlp exits, so the one-hour
+        # limit is enforced by a timer that kills the process group; that ends
+        # the output and lets the loop below finish
+        timed_out = threading.Event()
+
+        def _on_deadline():
+            timed_out.set()
+            self._kill_process(process)
+
+        killer = threading.Timer(3600, _on_deadline)
+        killer.daemon = True
+        killer.start()
         try:
-            # Extract number and unit
-            match = re.match(r'(\d+(?:\.\d+)?)([KMGT]?i?B)', size_str.upper())
-            if not match:
-                return 0
-
-            number = float(match.group(1))
-            unit = match.group(2)
-
-            multipliers = {
-                'B': 1,
-                'KB': 1024, 'KIB': 1024,
-                'MB': 1024**2, 'MIB': 1024**2,
-                'GB': 1024**3, 'GIB': 1024**3,
-                'TB': 1024**4, 'TIB': 1024**4
+            # Monitor progress (yt-dlp progress is typically written to stderr, so we merge stderr->stdout above)
+            for line in self._output_lines(process):
+                line = line.strip()
+                if not line:
+                    continue
+
+                # Everything except [download] lines takes this cheap path
+                is_dl = line.startswith('[download]')
+
+                # Keep a short tail for error reporting (progress lines say nothing there)
+                if not is_dl or '%' not in line:
+                    recent_output.append(line)
+
+                if not is_dl:
+                    continue
+
+                # Extract filename from destination line first
+                if 'Destination:' in line:
+                    try:
+                        filename = line.split('Destination:')[1].strip()
+                        filename = filename.split()[0] if filename else "video.mp4"
+                    except:
+                        pass
+
+                # Parse progress information
+                if '%' in line:
+                    try:
+                        # Extract percentage
+                        percent_match = _PERCENT_RE.search(line)
+                        if percent_match:
+                            percent = float(percent_match.group(1))
+                        else:
+                            percent = 0
+
+                        # Extract size information if available
+                        size_match = _SIZE_RE.search(line)
+                        if size_match:
+                            size_str = size_match.group(1)
+                            total_size = self._parse_size(size_str)
+                            downloaded_size = int((percent / 100) * total_size) if total_size > 0 else 0
+
+                        # Calculate speed
+                        speed = "N/A"
+                        speed_match = _SPEED_RE.search(line)
+                        if speed_match:
+                            speed = speed_match.group(1)
+
+                        # Throttle progress updates
+                        current_time = time.monotonic()
+                        if on_progress and current_time >= next_report_at:
+                            on_progress(
+                                download_id,
+                                filename,
+                                min(100, max(0, percent)),
+                                speed,
+                                total_size,
+                                downloaded_size
+                            )
+                            next_report_at = current_time + min_progress_interval
+                    except Exception as e:
+                        continue  # Skip malformed progress lines
+
+            process.wait()
+        finally:
+            killer.cancel()
+
+        if timed_out.is_set():
+            return {'success': False, 'timeout': True, 'filename': None, 'output_file': None, 'error': None}
+
+        if process.returncode == 0:
+            time.sleep(1)
+            return {
+                'success': True,
+                'timeout': False,
+                'filename': filename,
+                'output_file': self._find_downloaded_file(filename),
+                'error': None
             }
 
-            return int(number * multipliers.get(unit, 1))
+        stderr_output = "\n".join(list(recent_output)[-40:])
+        return {
+            'success': False,
+            'timeout': False,
+            'filename': None,
+            'output_file': None,
+            'error': stderr_output or f"Return code {process.returncode}"
+        }
+
+    def _parse_size(self, size_str):
+        """Parse size string like '10.5MiB' to bytes"""
+        try:
+            # Split the number from the unit letters
+            number = size_str.rstrip('BbIiKkMmGgTt')
+            unit = size_str[len(number):len(number) + 1].upper()
+            return int(float(number) * _UNIT_MULT.get(unit, 1))
         except:
             return 0
 
@@ -481,17 +767,19 @@ class StreamingDownloadManager:
             # Look for files modified in the last 60 seconds
             current_time = time.time()
             recent_files = []
-            
-            for file in self.download_dir.glob('*'):
-                if file.is_file():
-                    mod_time = file.stat().st_mtime
-                    if current_time - mod_time < 60:  # Modified in last 60 seconds
-                        recent_files.append((file, mod_time))
-            
+
+            # scandir entries carry the file type (and on Windows the stat data)
+            # from the directory listing, saving a syscall per file
+            with os.scandir(self.download_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        mod_time = entry.stat().st_mtime
+                        if current_time - mod_time < 60:  # Modified in last 60 seconds
+                            recent_files.append((entry.path, mod_time))
+
             # Return the most recently modified file
             if recent_files:
-                recent_files.sort(key=lambda x: x[1], reverse=True)
-                return str(recent_files[0][0])
+                return max(recent_files, key=lambda x: x[1])[0]
             
             # Fallback to constructed path
             return str(self.download_dir / filename)
@@ -499,6 +787,140 @@ class StreamingDownloadManager:
             return str(self.download_dir / filename)
 
 
+class SegmentTuner:
+    """
+    Picks the length of the next segment from the throughput of finished ones.
+    Grows the length additively while throughput holds up and halves it when
+    throughput drops, so fast links settle on long segments and stalls back off.
+    """
+
+    MIN_SIZE = 1024 * 1024
+    MAX_SIZE = 16 * 1024 * 1024
+    DELTA = 1024 * 1024
+
+    def __init__(self, initial_size=TARGET_SEGMENT_SIZE):
+        self.segment_size = max(self.MIN_SIZE, min(self.MAX_SIZE, initial_size))
+        self.last_throughput = 0
+
+    def record(self, bytes_downloaded, elapsed):
+        """Feed back the result of one finished segment"""
+        if elapsed <= 0 or bytes_downloaded <= 0:
+            return
+        throughput = bytes_downloaded / elapsed
+        if throughput > self.last_throughput * 0.9:
+            self.segment_size = min(self.MAX_SIZE, self.segment_size + self.DELTA)
+        else:
+            self.segment_size = max(self.MIN_SIZE, self.segment_size // 2)
+        self.last_throughput = throughput
+
+    def next_range(self, start, limit):
+        """Return the end byte of the next segment starting at start, stopping before limit"""
+        end = min(limit, start + self.segment_size) - 1
+        # Fold a tail shorter than MIN_SIZE into this segment
+        if limit - (end + 1) < self.MIN_SIZE:
+            end = limit - 1
+        return end
+
+
+class ConcurrencyTuner:
+    """
+    Picks how many segments of one download run at once. More streams stop
+    helping past some point (servers often cap throughput per client), so the
+    count is halved when throughput falls well below the best recent interval
+    twice in a row, and grows back by one while throughput keeps rising.
+    """
+
+    INTERVAL = 2.0  # Seconds between measurements
+    MIN_STREAMS = 2
+
+    def __init__(self, max_streams):
+        self.max_streams = max_streams
+        self.streams = max_streams
+        self.history = deque(maxlen=5)
+        self.drops = 0
+        self.last_time = None
+        self.last_received = 0
+
+    def update(self, received, now):
+        """Feed the total bytes received so far; returns the stream count to use"""
+        if self.last_time is None:
+            self.last_time, self.last_received = now, received
+            return self.streams
+        elapsed = now - self.last_time
+        if elapsed < self.INTERVAL:
+            return self.streams
+        throughput = (received - self.last_received) / elapsed
+        self.last_time, self.last_received = now, received
+
+        if self.history and throughput < 0.8 * max(self.history):
+            self.drops += 1
+            if self.drops >= 2:
+                self.streams = max(min(self.MIN_STREAMS, self.max_streams), self.streams // 2)
+                self.drops = 0
+                # Compare against what the new stream count achieves
+                self.history.clear()
+        else:
+            self.drops = 0
+            if self.history and throughput > self.history[-1] and self.streams < self.max_streams:
+                self.streams += 1
+        self.history.append(throughput)
+        return self.streams
+
+
+class _RangeIgnored(Exception):
+    """A ranged request got the whole file back, e.g. because If-Range no longer matched"""
+
+
+class _Suspended(Exception):
+    """Raised by a paused download to give its worker back until resumed"""
+
+
+def _running_event():
+    event = threading.Event()
+    event.set()
+    return event
+
+
+@dataclass
+class DownloadState:
+    """
+    State of one download. Compound updates take the download's own lock, so
+    downloads never contend with each other; single-field writes such as the
+    downloaded counter are atomic under the GIL and need no lock.
+    """
+
+    url: str
+    filename: str
+    output_file: str
+    size: int
+    referer: str = None
+    resumable: bool = False
+    validator: str = None  # ETag or Last-Modified sent as If-Range with segment requests
+    status: str = 'downloading'
+    downloaded: int = 0
+    start_time: float = field(default_factory=time.time)
+    # time.monotonic() at start_time; speeds use it so clock changes cannot skew them
+    clock_start: float = field(default_factory=time.monotonic)
+    done_ranges: list = field(default_factory=list)  # (start, end) byte ranges already on disk
+    on_progress: object = None
+    on_complete: object = None
+    on_error: object = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    # Set while running and cleared while paused, so workers block on it instead of polling
+    resume_event: threading.Event = field(default_factory=_running_event)
+    # Paused with no worker attached; resuming or cancelling resubmits the download
+    suspended: bool = False
+    # A suspended single-stream download keeps its open response here:
+    # (response, body iterator, bytes written, total size)
+    parked_stream: tuple = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def snapshot(self):
+        """Return the state as a plain dict (without the lock)"""
+        with self.lock:
+            return {f.name: getattr(self, f.name) for f in fields(self) if f.name != 'lock'}
+
+
 class DownloadManager:
     """Manages individual downloads with segmented multi-threaded approach"""
 
@@ -514,26 +936,81 @@ class DownloadManager:
         self.download_dir.mkdir(parents=True, exist_ok=True)
         
         self.num_threads = num_threads
-        self.downloads = {}  # Track all downloads
-        self.lock = threading.Lock()  # Thread-safe access
+        self.downloads = {}  # Maps download_id to DownloadState
+        self.lock = threading.Lock()  # Guards the downloads dict only
+
+        # Downloads run on a bounded pool; extra ones wait their turn
+        file_workers = max(2, (os.cpu_count() or 4) // 2)
+
+        # Shared session so segments reuse keep-alive connections instead of
+        # paying a new TCP/TLS handshake per request
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            # Room for every segment worker plus every download's own probe or
+            # stream, so no finished request has its keep-alive connection discarded
+            pool_maxsize=self.num_threads + file_workers,
+            # Also retry transient server-side failures and rate limiting
+            max_retries=Retry(total=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # One reusable curl handle per segment worker (keeps its connection alive)
+        self._curl_local = threading.local()
+
+        # Segment workers are shared by all downloads, so concurrent downloads
+        # queue for a fixed set of threads instead of each spawning its own
+        self.segment_pool = ThreadPoolExecutor(
+            max_workers=self.num_threads,
+            thread_name_prefix='mydm-seg'
+        )
+        self.file_pool = ThreadPoolExecutor(
+            max_workers=file_workers,
+            thread_name_prefix='mydm-file'
+        )
+
+        # Progress of running segmented downloads. Segment workers only bump their
+        # own counter; one reporter thread sums them and calls on_progress.
+        self._progress_trackers = {}
+        self._report_lock = threading.Lock()  # Held while a report sweep runs
+        self._reporter_thread = threading.Thread(
+            target=self._report_progress,
+            name='mydm-progress',
+            daemon=True
+        )
+        self._reporter_thread.start()
 
     def generate_download_id(self, url):
         """Generate unique download ID from URL"""
-        return hashlib.md5(url.encode()).hexdigest()[:12]
+        # Same scheme as streaming downloads, so every ID looks alike whatever is installed
+        return hashlib.blake2b(url.encode(), digest_size=6).hexdigest()
 
     def get_file_info(self, url, referer=None):
         """
         Get file information from URL (name, size, resumable)
         
         Returns:
-            dict: {filename, size, resumable, headers}
+            dict: {filename, size, resumable, validator, headers}
         """
         try:
-            headers = {'User-Agent': 'MyDM/1.0'}
+            headers = dict(_DEFAULT_HEADERS)
             if referer:
                 headers['Referer'] = referer
 
-            response = requests.head(url, headers=headers, allow_redirects=True, timeout=10)
+            response = self.session.head(url, headers=headers, allow_redirects=True, timeout=10)
+            if response.status_code in (403, 405) or 'content-length' not in response.headers:
+                # Many CDNs refuse HEAD or leave out the length. A one-byte ranged GET
+                # returns the same headers plus the total size in Content-Range.
+                response = self.session.get(
+                    url,
+                    headers={**headers, 'Range': 'bytes=0-0'},
+                    stream=True,
+                    timeout=10
+                )
+                if response.status_code == 206:
+                    response.content  # Read the single byte so the connection can be reused
+                response.close()
             response.raise_for_status()
 
             # Get filename
@@ -550,85 +1027,269 @@ class DownloadManager:
             # Sanitize for Windows
             filename = sanitize_filename(filename)
 
-            # Get file size
-            size = int(response.headers.get('content-length', 0))
-            
-            # Check if server supports range requests
-            resumable = response.headers.get('accept-ranges', 'none') != 'none'
+            if response.status_code == 206:
+                # Content-Range: bytes 0-0/TOTAL (TOTAL may be '*' if unknown)
+                total = response.headers.get('content-range', '').rpartition('/')[2]
+                size = int(total) if total.isdigit() else 0
+                resumable = True
+            else:
+                # Get file size
+                size = int(response.headers.get('content-length', 0))
+
+                # Check if server supports range requests
+                resumable = response.headers.get('accept-ranges', 'none') != 'none'
+
+            # Identifies this version of the file for If-Range. Weak ETags are
+            # not allowed there, so fall back to Last-Modified for those.
+            validator = response.headers.get('etag')
+            if not validator or validator.startswith('W/'):
+                validator = response.headers.get('last-modified')
 
             return {
                 'filename': filename,
                 'size': size,
                 'resumable': resumable,
+                'validator': validator,
                 'headers': dict(response.headers)
             }
         except Exception as e:
             raise Exception(f"Failed to get file info: {str(e)}")
 
-    def download_segment(self, url, start_byte, end_byte, segment_num, output_file, referer=None):
+    def _open_http2_client(self, url):
+        """
+        Create an HTTP/2 client for one download, or None if httpx is missing
+        or the URL is not HTTPS. A single connection carries every segment as
+        its own stream, so the transfer pays one TCP slow-start instead of one
+        per segment. It is per download because the connection limit applies
+        to the whole client, not to each host.
         """
-        Download a segment of the file
+        if httpx is None or not url.lower().startswith('https://'):
+            return None
+        return httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+            follow_redirects=True,
+            timeout=30
+        )
+
+    def _stream_range(self, url, headers, h2_client=None, protocol=None):
+        """
+        Yield the body of a ranged GET request in pieces of up to READ_CHUNK_SIZE.
+        With h2_client the request goes through httpx, and the negotiated HTTP
+        version is stored in protocol[0] once the response headers arrive.
+        """
+        # Writing at an offset is only safe if we got exactly the requested range
+        if h2_client is not None:
+            for attempt in range(RETRY_TOTAL + 1):
+                if attempt:
+                    time.sleep(_retry_delay(attempt))
+                with h2_client.stream('GET', url, headers=headers) as response:
+                    if protocol is not None:
+                        protocol[0] = response.http_version
+                    if response.status_code in RETRY_STATUSES and attempt < RETRY_TOTAL:
+                        continue
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise _RangeIgnored("Server ignored range request")
+                    yield from response.iter_bytes(chunk_size=READ_CHUNK_SIZE)
+                    return
+        else:
+            response = self.session.get(
+                url,
+                headers=headers,
+                timeout=30,
+                stream=True
+            )
+            try:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise _RangeIgnored("Server ignored range request")
+                yield from _iter_body(response.raw)
+            finally:
+                # The caller may stop early when its range was shortened
+                response.close()
+
+    def _curl_range(self, url, headers, f, progress=None, start_byte=0, limit=None,
+                    cancel_event=None, resume_event=None):
+        """
+        Transfer a ranged GET request straight into file object f using libcurl.
+        Stops early once the file position passes limit[0], if a limit is given.
+        """
+        curl = getattr(self._curl_local, 'handle', None)
+        if curl is None:
+            curl = self._curl_local.handle = pycurl.Curl()
+        else:
+            curl.reset()
+
+        ignored_range = []
+        reached_limit = []
+        paused = []
+
+        def on_header(line):
+            # Writing at an offset is only safe if we got exactly the requested range,
+            # so abort before the body if the final response is a 2xx other than 206
+            if line.startswith(b'HTTP/'):
+                parts = line.split()
+                if len(parts) > 1 and parts[1].startswith(b'2') and parts[1] != b'206':
+                    ignored_range.append(True)
+                    return 0
+
+        curl.setopt(pycurl.URL, url)
+        curl.setopt(pycurl.HTTPHEADER, [f'{name}: {value}' for name, value in headers.items()])
+        curl.setopt(pycurl.FOLLOWLOCATION, True)
+        curl.setopt(pycurl.FAILONERROR, True)
+        curl.setopt(pycurl.CONNECTTIMEOUT, 30)
+        # Equivalent of a 30s read timeout: give up if the transfer stalls
+        curl.setopt(pycurl.LOW_SPEED_LIMIT, 1)
+        curl.setopt(pycurl.LOW_SPEED_TIME, 30)
+        curl.setopt(pycurl.BUFFERSIZE, READ_CHUNK_SIZE)
+        curl.setopt(pycurl.HEADERFUNCTION, on_header)
+        curl.setopt(pycurl.WRITEDATA, f)
+        if progress is not None or limit is not None or cancel_event is not None:
+            def on_transfer(dltotal, dlnow, ultotal, ulnow):
+                if progress is not None:
+                    progress[0] = dlnow
+                if limit is not None and start_byte + dlnow > limit[0]:
+                    reached_limit.append(True)
+                    return 1  # Abort: the rest of the range was given to another segment
+                if cancel_event is not None and cancel_event.is_set():
+                    return 1
+                if resume_event is not None and not resume_event.is_set():
+                    paused.append(True)
+                    return 1  # Paused: stop here so the worker is free for other downloads
+            curl.setopt(pycurl.NOPROGRESS, False)
+            curl.setopt(pycurl.XFERINFOFUNCTION, on_transfer)
+
+        start_position = f.tell()
+        for attempt in range(RETRY_TOTAL + 1):
+            if attempt:
+                time.sleep(_retry_delay(attempt))
+            try:
+                curl.perform()
+                return
+            except pycurl.error as e:
+                if reached_limit or paused:
+                    return
+                if cancel_event is not None and cancel_event.is_set():
+                    raise Exception("Download cancelled")
+                if ignored_range:
+                    raise _RangeIgnored("Server ignored range request")
+                # FAILONERROR stops before the body, so a transient status can be retried as is
+                status = curl.getinfo(pycurl.RESPONSE_CODE)
+                if status in RETRY_STATUSES and attempt < RETRY_TOTAL and f.tell() == start_position:
+                    continue
+                raise Exception(e.args[-1] if e.args else str(e))
+
+    def download_segment(self, url, start_byte, end_byte, segment_num, output_file, referer=None, h2_client=None,
+                         progress=None, limit=None, if_range=None, cancel_event=None, resume_event=None,
+                         protocol=None):
+        """
+        Download a segment of the file directly into its place in the output file
         
         Args:
             url: Download URL
             start_byte: Start byte position
             end_byte: End byte position
             segment_num: Segment number
-            output_file: Path to output file
+            output_file: Path to pre-allocated output file
             referer: Referer header (optional)
+            h2_client: httpx client (HTTP/2) to use instead of the requests session (optional)
+            progress: One-element list kept updated with the bytes received so far (optional)
+            limit: One-element list holding the last byte to write; may be lowered while
+                the segment runs to hand the rest of the range to another segment (optional)
+            if_range: ETag or Last-Modified value the range must still match (optional)
+            cancel_event: Event that stops the segment once set (optional)
+            resume_event: Event that is cleared while paused; the segment then stops at its
+                current position and the caller fetches the rest after resuming (optional)
+            protocol: One-element list that receives the HTTP version h2_client negotiated (optional)
             
         Returns:
-            dict: {bytes_downloaded, success, error}
+            dict: {bytes_downloaded, elapsed, success, error}
         """
-        segment_file = f"{output_file}.part{segment_num}"
         bytes_downloaded = 0
+        started = time.monotonic()
 
         try:
-            headers = {
-                'User-Agent': 'MyDM/1.0',
-                'Range': f'bytes={start_byte}-{end_byte}'
-            }
+            headers = dict(_DEFAULT_HEADERS)
+            headers['Range'] = f'bytes={start_byte}-{end_byte}'
             if referer:
                 headers['Referer'] = referer
+            if if_range:
+                # If the file changed since it was probed, the server answers 200
+                # with the whole file, which is rejected instead of mixed in
+                headers['If-Range'] = if_range
+
+            # Each segment has its own handle, so seeking does not race with other segments
+            buffering = _write_buffer_size(os.path.dirname(output_file))
+            with open(output_file, 'r+b', buffering=buffering) as f:
+                f.seek(start_byte)
+                try:
+                    if pycurl is not None and h2_client is None:
+                        self._curl_range(url, headers, f, progress, start_byte, limit,
+                                         cancel_event, resume_event)
+                    else:
+                        received = 0
+                        # Bound once so the per-chunk checks skip attribute lookups
+                        write = f.write
+                        running = resume_event.is_set if resume_event is not None else None
+                        cancelled = cancel_event.is_set if cancel_event is not None else None
+                        for chunk in self._stream_range(url, headers, h2_client, protocol):
+                            # Plain event checks, so pausing and cancelling cost no lock per chunk
+                            if cancelled is not None and cancelled():
+                                raise Exception("Download cancelled")
+                            if chunk:
+                                if limit is not None:
+                                    room = limit[0] + 1 - start_byte - received
+                                    if room < len(chunk):
+                                        write(chunk[:max(0, room)])
+                                        break
+                                write(chunk)
+                                received += len(chunk)
+                                if progress is not None:
+                                    progress[0] = received
+                            if running is not None and not running():
+                                # Paused: end here instead of holding a shared worker
+                                break
+                finally:
+                    bytes_downloaded = f.tell() - start_byte
+                    if limit is not None:
+                        # Bytes past a lowered limit belong to another segment
+                        bytes_downloaded = min(bytes_downloaded, limit[0] + 1 - start_byte)
+                    _drop_cached(f, start_byte, bytes_downloaded)
 
-            response = requests.get(
-                url,
-                headers=headers,
-                timeout=30,
-                stream=True
-            )
-            response.raise_for_status()
-
-            with open(segment_file, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        bytes_downloaded += len(chunk)
-
-            return {'bytes_downloaded': bytes_downloaded, 'success': True, 'error': None}
+            return {
+                'bytes_downloaded': bytes_downloaded,
+                'elapsed': time.monotonic() - started,
+                'success': True,
+                'error': None
+            }
 
         except Exception as e:
-            return {'bytes_downloaded': bytes_downloaded, 'success': False, 'error': str(e)}
+            return {
+                'bytes_downloaded': bytes_downloaded,
+                'elapsed': time.monotonic() - started,
+                'success': False,
+                'error': str(e),
+                # The file changed on the server, so the data already on disk is stale
+                'range_ignored': isinstance(e, _RangeIgnored)
+            }
 
-    def merge_segments(self, output_file, num_segments):
+    def _preallocate(self, output_file, file_size):
         """
-        Merge downloaded segments into final file
-        
-        Args:
-            output_file: Path to final output file
-            num_segments: Number of segments to merge
+        Create output_file with file_size bytes reserved on disk.
+        Reserving the blocks up front keeps the file in few extents while
+        segments fill it in out of order.
         """
-        try:
-            with open(output_file, 'wb') as outf:
-                for i in range(num_segments):
-                    segment_file = f"{output_file}.part{i}"
-                    if os.path.exists(segment_file):
-                        with open(segment_file, 'rb') as inf:
-                            outf.write(inf.read())
-                        # Clean up segment
-                        os.remove(segment_file)
-        except Exception as e:
-            raise Exception(f"Failed to merge segments: {str(e)}")
+        with open(output_file, 'wb') as f:
+            if hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(f.fileno(), 0, file_size)
+                    return
+                except OSError:
+                    # Filesystem does not support it; fall back to a plain resize
+                    pass
+            # On Windows this sets the end of file, which allocates the space
+            f.truncate(file_size)
 
     def start_download(self, url, referer=None, on_progress=None, on_complete=None, on_error=None):
         """
@@ -647,8 +1308,15 @@ class DownloadManager:
         download_id = self.generate_download_id(url)
 
         # Check if already downloading
-        with self.lock:
-            if download_id in self.downloads and self.downloads[download_id]['status'] in ['downloading', 'paused']:
+        state = self._get_state(download_id)
+        if state:
+            with state.lock:
+                if state.status in ['downloading', 'paused']:
+                    return download_id
+                # A failed download with data on disk continues where it stopped
+                retry = state.status == 'error' and state.done_ranges
+            if retry:
+                self.resume_download(download_id)
                 return download_id
 
         # Get file info
@@ -662,28 +1330,29 @@ class DownloadManager:
         # Ensure filename is sanitized (double safety)
         safe_name = sanitize_filename(file_info['filename'])
         output_file = self.download_dir / safe_name
+
+        state = DownloadState(
+            url=url,
+            filename=file_info['filename'],
+            output_file=str(output_file),
+            size=file_info['size'],
+            referer=referer,
+            resumable=file_info['resumable'],
+            validator=file_info.get('validator'),
+            on_progress=on_progress,
+            on_complete=on_complete,
+            on_error=on_error
+        )
         
         # Check if file already exists and is complete
         if output_file.exists():
             file_size_on_disk = output_file.stat().st_size
             if file_size_on_disk == file_info['size']:
                 # File already exists and appears complete
+                state.status = 'complete'
+                state.downloaded = file_info['size']
                 with self.lock:
-                    self.downloads[download_id] = {
-                        'url': url,
-                        'filename': file_info['filename'],
-                        'output_file': str(output_file),
-                        'size': file_info['size'],
-                        'downloaded': file_info['size'],
-                        'status': 'complete',
-                        'start_time': time.time(),
-                        'paused': False,
-                        'cancelled': False,
-                        'referer': referer,
-                        'on_progress': on_progress,
-                        'on_complete': on_complete,
-                        'on_error': on_error
-                    }
+                    self.downloads[download_id] = state
                 
                 # Immediately call completion callback
                 if on_complete:
@@ -693,39 +1362,33 @@ class DownloadManager:
         
         # Initialize download state
         with self.lock:
-            self.downloads[download_id] = {
-                'url': url,
-                'filename': file_info['filename'],
-                'output_file': str(output_file),
-                'size': file_info['size'],
-                'downloaded': 0,
-                'status': 'downloading',
-                'start_time': time.time(),
-                'paused': False,
-                'cancelled': False,
-                'referer': referer,
-                'on_progress': on_progress,
-                'on_complete': on_complete,
-                'on_error': on_error
-            }
+            self.downloads[download_id] = state
 
-        # Start download in background thread
-        thread = threading.Thread(
-            target=self._execute_download,
-            args=(download_id, url, referer, file_info, output_file, on_progress),
-            daemon=True
+        # Start download in the background
+        self.file_pool.submit(
+            self._execute_download,
+            download_id, url, referer, file_info, output_file, on_progress
         )
-        thread.start()
 
         return download_id
 
+    def _get_state(self, download_id):
+        """Look up the DownloadState for download_id (None if unknown)"""
+        with self.lock:
+            return self.downloads.get(download_id)
+
     def _execute_download(self, download_id, url, referer, file_info, output_file, on_progress):
         """Execute the actual download (called in thread)"""
+        state = self._get_state(download_id)
         try:
             file_size = file_info['size']
             
-            # If file size is 0 or very small, download as single segment
-            if file_size < 1024 * 1024:  # Less than 1MB
+            if 0 < file_size < 1024 * 1024:  # Known and less than 1MB
+                # Latency-bound, not bandwidth-bound: fetch in one go
+                self._download_small_file(download_id, url, referer, output_file)
+            elif file_size < 1024 * 1024 or not file_info['resumable']:
+                # Unknown size, or no range support (segments need 206 responses):
+                # stream as single segment
                 self._download_single_segment(
                     download_id, url, referer, output_file, on_progress
                 )
@@ -736,192 +1399,527 @@ class DownloadManager:
                 )
 
             # Mark as complete
-            with self.lock:
-                self.downloads[download_id]['status'] = 'complete'
-                self.downloads[download_id]['downloaded'] = file_size
-
-            if self.downloads[download_id]['on_complete']:
-                self.downloads[download_id]['on_complete'](
-                    download_id, file_info['filename'], str(output_file)
+            with state.lock:
+                state.status = 'complete'
+                state.downloaded = file_size
+
+            if state.on_complete:
+                state.on_complete(download_id, file_info['filename'], str(output_file))
+
+        except _Suspended:
+            with state.lock:
+                # Resumed or cancelled while the segments were stopping: carry on now
+                carry_on = state.status != 'paused'
+                state.suspended = not carry_on
+            if carry_on:
+                self.file_pool.submit(
+                    self._execute_download,
+                    download_id, url, referer, file_info, output_file, on_progress
                 )
 
         except Exception as e:
-            with self.lock:
-                self.downloads[download_id]['status'] = 'error'
+            with state.lock:
+                # A cancelled download stays cancelled, so it cannot be resumed
+                if not state.cancel_event.is_set():
+                    state.status = 'error'
+
+            if state.on_error:
+                state.on_error(download_id, str(e))
+
+    def _download_small_file(self, download_id, url, referer, output_file):
+        """Download a small file of known size with one read and one write"""
+        headers = dict(_DEFAULT_HEADERS)
+        if referer:
+            headers['Referer'] = referer
+
+        response = self.session.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        data = response.content
 
-            if self.downloads[download_id]['on_error']:
-                self.downloads[download_id]['on_error'](download_id, str(e))
+        state = self._get_state(download_id)
+        if state.cancel_event.is_set():
+            raise Exception("Download cancelled")
+
+        with open(output_file, 'wb') as f:
+            f.write(data)
 
     def _download_single_segment(self, download_id, url, referer, output_file, on_progress):
         """Download file as single segment"""
+        # Written under a temporary name and renamed once complete, so an
+        # interrupted (possibly preallocated) file never looks finished
+        partial_file = f"{output_file}.part"
+        state = self._get_state(download_id)
+        response = None
         try:
-            headers = {'User-Agent': 'MyDM/1.0'}
-            if referer:
-                headers['Referer'] = referer
+            with state.lock:
+                parked, state.parked_stream = state.parked_stream, None
 
-            response = requests.get(
-                url,
-                headers=headers,
-                timeout=30,
-                stream=True
-            )
-            response.raise_for_status()
-
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            last_progress_time = 0
-            min_progress_interval = 0.5  # Throttle to max 2 updates per second
-
-            with open(output_file, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    # Check for pause/cancel
-                    with self.lock:
-                        if self.downloads[download_id]['cancelled']:
-                            raise Exception("Download cancelled")
-                        while self.downloads[download_id]['paused']:
-                            time.sleep(0.1)
+            if parked:
+                # Resumed: carry on reading the response that was left open
+                response, body, downloaded, total_size = parked
+                mode = 'r+b'
+            else:
+                headers = dict(_DEFAULT_HEADERS)
+                if referer:
+                    headers['Referer'] = referer
+
+                response = self.session.get(
+                    url,
+                    headers=headers,
+                    timeout=30,
+                    stream=True
+                )
+                response.raise_for_status()
+
+                total_size = int(response.headers.get('content-length', 0))
+                body = _iter_body(response.raw)
+                downloaded = 0
+
+                mode = 'wb'
+                if total_size > 0:
+                    # The length was only announced on the GET; reserve the space now
+                    self._preallocate(partial_file, total_size)
+                    mode = 'r+b'
+
+            # Integer deadline: one clock read and compare per chunk, no float math
+            next_progress_ns = 0
+
+            cancel_event = state.cancel_event
+            resume_event = state.resume_event
+            filename = os.path.basename(str(output_file))
+
+            buffering = _write_buffer_size(os.path.dirname(output_file))
+            with open(partial_file, mode, buffering=buffering) as f:
+                if parked:
+                    f.seek(downloaded)
+                # Bound once so the per-chunk work skips attribute lookups
+                write = f.write
+                running = resume_event.is_set
+                cancelled = cancel_event.is_set
+                for chunk in body:
+                    if cancelled():
+                        raise Exception("Download cancelled")
 
                     if chunk:
-                        f.write(chunk)
+                        write(chunk)
                         downloaded += len(chunk)
 
-                        # Throttle progress updates
-                        current_time = time.time()
-                        if on_progress and total_size > 0 and (current_time - last_progress_time) >= min_progress_interval:
-                            percent = min(100, int((downloaded / total_size) * 100))
-                            speed = self._calculate_speed(download_id, downloaded)
-                            on_progress(
-                                download_id,
-                                file_info['filename'] if 'file_info' in locals() else 'file',
-                                percent,
-                                speed,
-                                total_size,
-                                downloaded
-                            )
-                            last_progress_time = current_time
-
-                        # Update downloaded size in state
-                        with self.lock:
-                            self.downloads[download_id]['downloaded'] = downloaded
+                        # Throttle progress updates and state bookkeeping together,
+                        # so the fast path is just write + add
+                        now_ns = time.monotonic_ns()
+                        if now_ns >= next_progress_ns:
+                            next_progress_ns = now_ns + PROGRESS_INTERVAL_NS
+
+                            # Update downloaded size in state
+                            state.downloaded = downloaded
+
+                            if on_progress and total_size > 0:
+                                percent = min(100, int((downloaded / total_size) * 100))
+                                speed = self._calculate_speed(state.clock_start, downloaded)
+                                on_progress(
+                                    download_id,
+                                    filename,
+                                    percent,
+                                    speed,
+                                    total_size,
+                                    downloaded
+                                )
+
+                    if not running():
+                        # Paused: without range support the stream cannot be
+                        # reopened, so keep it open and give the worker back
+                        state.downloaded = downloaded
+                        with state.lock:
+                            state.parked_stream = (response, body, downloaded, total_size)
+                        raise _Suspended()
+
+                if mode == 'r+b':
+                    # Content-Length may not match the decoded body; end the file where writing did
+                    f.truncate()
+
+            os.replace(partial_file, output_file)
+
+        except _Suspended:
+            raise
 
         except Exception as e:
+            if response is not None:
+                response.close()
+            # Without range support there is nothing to resume from
+            if os.path.exists(partial_file):
+                try:
+                    os.remove(partial_file)
+                except:
+                    pass
             raise e
 
+    def _missing_ranges(self, done_ranges, file_size):
+        """Return the (start, end) byte ranges of [0, file_size) not covered by done_ranges"""
+        gaps = []
+        position = 0
+        for start, end in sorted(done_ranges):
+            if start > position:
+                gaps.append((position, start - 1))
+            position = max(position, end + 1)
+        if position < file_size:
+            gaps.append((position, file_size - 1))
+        return gaps
+
     def _download_multi_segment(self, download_id, url, referer, output_file, file_size, on_progress):
         """Download file with multiple segments"""
-        segment_size = file_size // self.num_threads
-        
-        # Create segments to download
-        segments = []
-        for i in range(self.num_threads):
-            start = i * segment_size
-            end = file_size - 1 if i == self.num_threads - 1 else (i + 1) * segment_size - 1
-            segments.append((i, start, end))
-
-        total_downloaded = 0
+        tuner = SegmentTuner()
+        concurrency = ConcurrencyTuner(self.num_threads)
+
+        # Segments land in a .part file that is renamed once complete, so a
+        # pre-allocated but unfinished file never looks like a finished download
+        partial_file = f"{output_file}.part"
+
+        state = self._get_state(download_id)
+        done_ranges = state.done_ranges
+
         segment_status = {}
-        last_progress_time = 0
-        min_progress_interval = 0.5  # Throttle to max 2 updates per second
+        futures = {}
+        processed = set()
+        h2_client = None
+
+        def record(future):
+            # Whatever reached the disk counts, even from a failed segment
+            processed.add(future)
+            seg_num, seg_start, _, _ = futures[future]
+            result = future.result()
+            segment_status[seg_num] = result
+            if result['bytes_downloaded']:
+                done_ranges.append((seg_start, seg_start + result['bytes_downloaded'] - 1))
+            return seg_num, result
 
         try:
-            with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-                futures = {}
+            if done_ranges and os.path.exists(partial_file):
+                # Continue a previous attempt: only fetch what is missing
+                gaps = self._missing_ranges(done_ranges, file_size)
+            else:
+                del done_ranges[:]
+                # Size the output file up front so every segment can write at its own offset
+                self._preallocate(partial_file, file_size)
+                gaps = [(0, file_size - 1)]
+
+            already_on_disk = file_size - sum(end - start + 1 for start, end in gaps)
+            segment_progress = []
+            self._progress_trackers[download_id] = {
+                'state': state,
+                'base': already_on_disk,
+                'segments': segment_progress,
+                'size': file_size,
+                'filename': os.path.basename(str(output_file)),
+                'on_progress': on_progress
+            }
 
-                for seg_num, start, end in segments:
-                    future = executor.submit(
-                        self.download_segment,
-                        url, start, end, seg_num, str(output_file), referer
+            # HTTP/2 is negotiated by the first segment itself: it goes out alone on a
+            # download-local client, and once the server has answered the rest follow
+            # on that connection, or on the usual backend if HTTP/2 was not agreed
+            h2_client = self._open_http2_client(url)
+            protocol = [None]
+
+            # Segments are issued as a pipeline: up to concurrency.streams are in flight
+            # and each new one is cut at the length the tuner currently recommends
+            next_seg_num = 0
+            pending = set()
+
+            def steal():
+                # Cut the running segment with the most left in half and return the
+                # second half as a new range
+                victim, most_left = None, 0
+                for future in pending:
+                    _, seg_start, limit, progress = futures[future]
+                    left = limit[0] + 1 - (seg_start + progress[0])
+                    if left > most_left:
+                        victim, most_left = future, left
+                if most_left < STEAL_MIN_SIZE:
+                    return None
+                _, seg_start, limit, progress = futures[victim]
+                mid = seg_start + progress[0] + most_left // 2
+                old_end = limit[0]
+                limit[0] = mid - 1
+                return mid, old_end
+
+            while gaps or pending:
+                if state.cancel_event.is_set():
+                    raise Exception("Download cancelled")
+                if not state.resume_event.is_set():
+                    # Paused: running segments stop on their own and no new ones are
+                    # issued. Once none are left, this worker is given back as well.
+                    if not pending:
+                        raise _Suspended()
+                else:
+                    # Lowering the stream count simply stops refilling until enough
+                    # running segments have finished
+                    streams = concurrency.update(
+                        sum(progress[0] for progress in segment_progress), time.monotonic()
                     )
-                    futures[future] = seg_num
+                    negotiating = h2_client is not None and protocol[0] is None
+                    if negotiating:
+                        streams = 1
+                    use_h2 = h2_client if protocol[0] in (None, 'HTTP/2') else None
+                    while len(pending) < streams:
+                        if gaps:
+                            gap_start, gap_end = gaps[0]
+                            end = tuner.next_range(gap_start, gap_end + 1)
+                            if end == gap_end:
+                                gaps.pop(0)
+                            else:
+                                gaps[0] = (end + 1, gap_end)
+                        else:
+                            stolen = steal()
+                            if stolen is None:
+                                break
+                            gap_start, end = stolen
+
+                        progress = [0]
+                        limit = [end]
+                        segment_progress.append(progress)
+                        future = self.segment_pool.submit(
+                            self.download_segment,
+                            url, gap_start, end, next_seg_num, partial_file, referer, use_h2, progress, limit,
+                            if_range=state.validator,
+                            cancel_event=state.cancel_event,
+                            resume_event=state.resume_event,
+                            protocol=protocol if negotiating else None
+                        )
+                        futures[future] = (next_seg_num, gap_start, limit, progress)
+                        pending.add(future)
+                        next_seg_num += 1
+
+                # While negotiating, check back soon for the first response headers
+                timeout = 0.05 if h2_client is not None and protocol[0] is None else ConcurrencyTuner.INTERVAL
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
 
-                # Monitor progress
-                for future in as_completed(futures):
-                    seg_num = futures[future]
-                    result = future.result()
-                    segment_status[seg_num] = result
+                for future in done:
+                    seg_num, result = record(future)
+                    _, seg_start, limit, _ = futures[future]
 
                     if result['success']:
-                        total_downloaded += result['bytes_downloaded']
+                        written_end = seg_start + result['bytes_downloaded'] - 1
+                        if written_end < limit[0]:
+                            # Stopped short (paused): fetch the rest of its range later
+                            bisect.insort(gaps, (written_end + 1, limit[0]))
+                        else:
+                            tuner.record(result['bytes_downloaded'], result['elapsed'])
+                    elif state.cancel_event.is_set():
+                        raise Exception("Download cancelled")
+                    elif h2_client is not None and protocol[0] is None:
+                        # No HTTP/2 response at all: fetch everything on the usual backend
+                        protocol[0] = ''
+                        bisect.insort(gaps, (seg_start + result['bytes_downloaded'], limit[0]))
+                    elif result.get('range_ignored'):
+                        raise _RangeIgnored(f"Segment {seg_num} failed: {result['error']}")
                     else:
                         raise Exception(f"Segment {seg_num} failed: {result['error']}")
 
-                    # Report progress (throttled)
-                    current_time = time.time()
-                    if on_progress and (current_time - last_progress_time) >= min_progress_interval:
-                        percent = min(100, int((total_downloaded / file_size) * 100))
-                        speed = self._calculate_speed(download_id, total_downloaded)
-                        on_progress(
-                            download_id,
-                            os.path.basename(str(output_file)),
-                            percent,
-                            speed,
-                            file_size,
-                            total_downloaded
-                        )
-                        last_progress_time = current_time
+                # Check for cancellation
+                if state.cancel_event.is_set():
+                    raise Exception("Download cancelled")
 
-                    # Check for cancellation
-                    with self.lock:
-                        if self.downloads[download_id]['cancelled']:
-                            raise Exception("Download cancelled")
+            os.replace(partial_file, output_file)
+            del done_ranges[:]
 
-            # Merge segments
-            self.merge_segments(str(output_file), self.num_threads)
+        except _Suspended:
+            # Every segment has stopped and recorded its range; nothing to clean up
+            raise
 
         except Exception as e:
-            # Clean up partial files
-            for i in range(self.num_threads):
-                part_file = f"{output_file}.part{i}"
-                if os.path.exists(part_file):
+            # Drop queued segments and let running ones finish before touching the file
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            for future in futures:
+                if future not in processed and not future.cancelled():
+                    record(future)
+
+            # Keep what we have for a later resume unless the user cancelled, the
+            # server cannot serve the missing ranges, or the file has changed since
+            if state.cancel_event.is_set() or not state.resumable or isinstance(e, _RangeIgnored):
+                del done_ranges[:]
+                if os.path.exists(partial_file):
                     try:
-                        os.remove(part_file)
+                        os.remove(partial_file)
                     except:
                         pass
             raise e
 
-    def _calculate_speed(self, download_id, bytes_downloaded):
+        finally:
+            # Taking the report lock guarantees no progress event for this download
+            # can be sent after this point (e.g. after on_complete)
+            with self._report_lock:
+                self._progress_trackers.pop(download_id, None)
+            # Every segment has finished by now, so nothing uses the connection
+            if h2_client is not None:
+                h2_client.close()
+
+    def _report_progress(self):
+        """Report progress of all running segmented downloads (runs in its own thread)"""
+        while True:
+            time.sleep(PROGRESS_INTERVAL)
+            with self._report_lock:
+                self._report_sweep()
+
+    def _report_sweep(self):
+        """Send one progress update for every running segmented download"""
+        for download_id, tracker in list(self._progress_trackers.items()):
+            if not tracker['state'].resume_event.is_set():
+                # Paused: nothing changes, and each update would mark it downloading again
+                continue
+            try:
+                # list() snapshots the counters while the coordinator may be appending
+                received = sum(progress[0] for progress in list(tracker['segments']))
+                # Segments cut short by a steal may overshoot their range slightly
+                downloaded = min(tracker['base'] + received, tracker['size'])
+                tracker['state'].downloaded = downloaded
+
+                if tracker['on_progress']:
+                    file_size = tracker['size']
+                    tracker['on_progress'](
+                        download_id,
+                        tracker['filename'],
+                        min(100, int((downloaded / file_size) * 100)),
+                        self._calculate_speed(tracker['state'].clock_start, received),
+                        file_size,
+                        downloaded
+                    )
+            except Exception:
+                # A failing callback must not stop reporting for other downloads
+                pass
+
+    def _calculate_speed(self, start_time, bytes_downloaded):
         """Calculate download speed"""
         try:
-            with self.lock:
-                start_time = self.downloads[download_id]['start_time']
-                elapsed = time.time() - start_time
-                if elapsed > 0:
-                    speed_bytes = bytes_downloaded / elapsed
-                    if speed_bytes < 1024:
-                        return f"{speed_bytes:.1f} B/s"
-                    elif speed_bytes < 1024 * 1024:
-                        return f"{speed_bytes / 1024:.1f} KB/s"
-                    else:
-                        return f"{speed_bytes / (1024 * 1024):.1f} MB/s"
+            elapsed = time.monotonic() - start_time
+            if elapsed > 0:
+                return _format_speed(bytes_downloaded / elapsed)
             return "0 B/s"
         except:
             return "0 B/s"
 
     def pause_download(self, download_id):
         """Pause a download"""
-        with self.lock:
-            if download_id in self.downloads:
-                self.downloads[download_id]['paused'] = True
-                self.downloads[download_id]['status'] = 'paused'
+        state = self._get_state(download_id)
+        if state:
+            with state.lock:
+                if state.status != 'downloading':
+                    return
+                state.resume_event.clear()
+                state.status = 'paused'
 
     def resume_download(self, download_id):
-        """Resume a paused download"""
-        with self.lock:
-            if download_id in self.downloads:
-                self.downloads[download_id]['paused'] = False
-                self.downloads[download_id]['status'] = 'downloading'
+        """Resume a paused download, or restart a failed one from the data already on disk"""
+        state = self._get_state(download_id)
+        if not state:
+            return
+        with state.lock:
+            if state.status not in ('paused', 'error'):
+                return
+            failed = state.status == 'error'
+            restart = failed or state.suspended
+            state.suspended = False
+            state.resume_event.set()
+            state.status = 'downloading'
+            if failed:
+                state.start_time = time.time()
+                state.clock_start = time.monotonic()
+
+        if failed:
+            self.file_pool.submit(self._restart_download, download_id)
+        elif restart:
+            file_info = {
+                'filename': state.filename,
+                'size': state.size,
+                'resumable': state.resumable
+            }
+            self.file_pool.submit(
+                self._execute_download,
+                download_id, state.url, state.referer, file_info,
+                Path(state.output_file), state.on_progress
+            )
+
+    def _restart_download(self, download_id):
+        """
+        Run a failed download again (called in thread). The server is probed
+        first, and the data on disk is only reused if the file is unchanged.
+        """
+        state = self._get_state(download_id)
+        try:
+            file_info = self.get_file_info(state.url, state.referer)
+        except Exception as e:
+            with state.lock:
+                if not state.cancel_event.is_set():
+                    state.status = 'error'
+            if state.on_error:
+                state.on_error(download_id, str(e))
+            return
+
+        with state.lock:
+            unchanged = (
+                file_info['resumable']
+                and state.validator is not None
+                and file_info.get('validator') == state.validator
+                and file_info['size'] == state.size
+            )
+            if not unchanged:
+                # Start over: the partial file is recreated from scratch
+                del state.done_ranges[:]
+            state.size = file_info['size']
+            state.resumable = file_info['resumable']
+            state.validator = file_info.get('validator')
+
+        file_info['filename'] = state.filename
+        self._execute_download(
+            download_id, state.url, state.referer, file_info,
+            Path(state.output_file), state.on_progress
+        )
 
     def cancel_download(self, download_id):
         """Cancel a download"""
+        state = self._get_state(download_id)
+        if state:
+            with state.lock:
+                if state.status == 'complete':
+                    return
+                state.cancel_event.set()
+                # Wake a paused worker so it can see the cancellation
+                state.resume_event.set()
+                state.status = 'cancelled'
+                # A suspended download has no worker; run it once so it cleans up
+                # and reports the cancellation like a running one
+                restart = state.suspended
+                state.suspended = False
+
+            if restart:
+                self.file_pool.submit(
+                    self._execute_download,
+                    download_id, state.url, state.referer,
+                    {'filename': state.filename, 'size': state.size, 'resumable': state.resumable},
+                    Path(state.output_file), state.on_progress
+                )
+
+    def close(self):
+        """
+        Stop accepting work and cancel every download. Downloads that have not
+        started yet are dropped; running and paused ones are woken so they wind
+        down promptly, and their worker threads exit once they have.
+        """
         with self.lock:
-            if download_id in self.downloads:
-                self.downloads[download_id]['cancelled'] = True
-                self.downloads[download_id]['status'] = 'cancelled'
+            states = list(self.downloads.values())
+        for state in states:
+            state.cancel_event.set()
+            state.resume_event.set()
+        for pool in (self.file_pool, self.segment_pool):
+            try:
+                pool.shutdown(wait=False, cancel_futures=True)
+            except TypeError:
+                # cancel_futures needs Python 3.9+
+                pool.shutdown(wait=False)
 
     def get_download_status(self, download_id):
         """Get current status of a download"""
-        with self.lock:
-            if download_id in self.downloads:
-                return self.downloads[download_id].copy()
+        state = self._get_state(download_id)
+        if state:
+            return state.snapshot()
         return None
-
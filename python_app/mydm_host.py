@@ -8,23 +8,40 @@ Handles download commands and reports progress back to extension
 import sys
 import json
 import os
-import struct
+import io
 import threading
+import queue
 import time
 from pathlib import Path
 import hashlib
 
+# Optional faster JSON codec; works on bytes directly, so messages skip the
+# separate UTF-8 encode/decode step
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fallback encoder, built once: compact separators, and non-ASCII text kept
+# as UTF-8 instead of being expanded to \uXXXX escapes
+_json_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from downloader import DownloadManager, StreamingDownloadManager
 
+LOG_FILE = Path.home() / 'AppData' / 'Local' / 'MyDM' / 'host.log'
+
 
 class NativeMessagingHost:
     """Handles native messaging protocol with Chrome extension"""
 
     def __init__(self):
         """Initialize the native messaging host"""
+        # Opened once: log() runs for every progress event
+        self._log_file = self._open_log()
+
         # Use user's Downloads folder by default
         downloads_dir = str(Path.home() / 'Downloads')
         
@@ -43,6 +60,30 @@ class NativeMessagingHost:
         # Track message queue for threading
         self.running = True
 
+        # Framed I/O goes straight to the pipe descriptors, bypassing the
+        # buffered stdio layer. Only the emitter thread below writes frames.
+        # Unbuffered reader over stdin: readinto() is a single read syscall
+        self._stdin = io.FileIO(sys.stdin.fileno(), 'rb', closefd=False)
+        # Reused for every incoming message; grown if one does not fit
+        self._hdr_buf = bytearray(4)
+        self._rx_buf = bytearray(64 * 1024)
+        self._stdout_fd = sys.stdout.fileno()
+
+        # Every outgoing message is queued; this thread does the serializing
+        # and the pipe writes, so frames go out in order and neither commands
+        # nor downloads wait on stdout. Only progress is dropped when full.
+        self.out_queue = queue.Queue(maxsize=256)
+        self._emitter = threading.Thread(target=self._emit_loop, name='mydm-emit', daemon=True)
+        self._emitter.start()
+
+        # Command name -> handler, so dispatch is one dict lookup per message
+        self._handlers = {
+            'download': self.handle_download_command,
+            'pause': self.handle_pause_command,
+            'resume': self.handle_resume_command,
+            'cancel': self.handle_cancel_command,
+        }
+
     def read_message(self):
         """
         Read a message from stdin (Chrome's native messaging protocol)
@@ -53,19 +94,24 @@ class NativeMessagingHost:
         """
         try:
             # Read the message length (first 4 bytes, little-endian)
-            length_bytes = sys.stdin.buffer.read(4)
-            if not length_bytes or len(length_bytes) != 4:
+            if not self._read_into(memoryview(self._hdr_buf)):
                 return None
 
-            message_length = struct.unpack('<I', length_bytes)[0]
+            message_length = int.from_bytes(self._hdr_buf, 'little')
+            if not message_length:
+                return None
 
             # Read the message content
-            message_data = sys.stdin.buffer.read(message_length)
-            if not message_data:
+            if message_length > len(self._rx_buf):
+                self._rx_buf = bytearray(message_length)
+            message_data = memoryview(self._rx_buf)[:message_length]
+            if not self._read_into(message_data):
                 return None
 
             # Parse JSON
-            message = json.loads(message_data.decode('utf-8'))
+            if orjson is not None:
+                return orjson.loads(message_data)
+            message = json.loads(str(message_data, 'utf-8'))
             return message
 
         except Exception as e:
@@ -74,26 +120,60 @@ class NativeMessagingHost:
 
     def send_message(self, message):
         """
-        Send a message to stdout (Chrome's native messaging protocol)
+        Queue a message for the emitter thread, which owns stdout
+
+        Args:
+            message: Dictionary to send as JSON
+        """
+        # Once the loop has stopped the emitter may be gone; don't block on it
+        if self.running:
+            self.out_queue.put(message)
+
+    def _write_message(self, message):
+        """
+        Write a message to stdout (Chrome's native messaging protocol)
         Format: [4-byte length][JSON payload]
         
         Args:
             message: Dictionary to send as JSON
         """
         try:
-            message_json = json.dumps(message)
-            message_bytes = message_json.encode('utf-8')
-            message_length = struct.pack('<I', len(message_bytes))
+            if orjson is not None:
+                message_bytes = orjson.dumps(message)
+            else:
+                message_bytes = _json_encode(message).encode('utf-8')
+            message_length = len(message_bytes).to_bytes(4, 'little')
 
-            # Write length + message
-            sys.stdout.buffer.write(message_length)
-            sys.stdout.buffer.flush()
-            sys.stdout.buffer.write(message_bytes)
-            sys.stdout.buffer.flush()
+            # Write length + message as one frame
+            self._write_all(message_length + message_bytes)
 
         except Exception as e:
             self.log(f"Error sending message: {str(e)}")
 
+    def _emit_loop(self):
+        """Send queued download events until a None sentinel arrives"""
+        while True:
+            message = self.out_queue.get()
+            if message is None:
+                break
+            self._write_message(message)
+
+    def _read_into(self, view):
+        """Fill view from stdin; returns False if stdin closes first"""
+        # Pipes may return short reads; keep reading until the view is full
+        while view:
+            n = self._stdin.readinto(view)
+            if not n:
+                return False
+            view = view[n:]
+        return True
+
+    def _write_all(self, data):
+        """Write data to stdout, retrying partial writes"""
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._stdout_fd, view):]
+
     def log(self, message, level="INFO"):
         """
         Log a message to a file (for debugging)
@@ -102,17 +182,25 @@ class NativeMessagingHost:
             message: Message to log
             level: Log level (INFO, WARNING, ERROR)
         """
+        if self._log_file is None:
+            return
         try:
-            log_file = Path.home() / 'AppData' / 'Local' / 'MyDM' / 'host.log'
-            log_file.parent.mkdir(parents=True, exist_ok=True)
-            
-            with open(log_file, 'a', encoding='utf-8') as f:
-                timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-                f.write(f"[{timestamp}] [{level}] {message}\n")
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+            # Unbuffered append: each line is one write, so threads logging at
+            # the same time cannot interleave within a line
+            self._log_file.write(f"[{timestamp}] [{level}] {message}\n".encode('utf-8'))
         except:
             # Silently fail if logging fails
             pass
 
+    def _open_log(self):
+        """Open the log file for appending, or return None if that fails"""
+        try:
+            LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+            return open(LOG_FILE, 'ab', buffering=0)
+        except OSError:
+            return None
+
     def on_progress(self, download_id, filename, percent, speed, total_size, downloaded):
         """Callback for download progress"""
         message = {
@@ -124,7 +212,11 @@ class NativeMessagingHost:
             'size': total_size,
             'downloaded': downloaded
         }
-        self.send_message(message)
+        try:
+            self.out_queue.put_nowait(message)
+        except queue.Full:
+            # Progress is cumulative, so the next update replaces a dropped one
+            pass
         self.log(f"Progress: {filename} - {percent}% ({speed})")
 
     def on_complete(self, download_id, filename, file_path):
@@ -163,7 +255,7 @@ class NativeMessagingHost:
             # Detect streaming sites and route to yt-dlp
             if StreamingDownloadManager.is_streaming_site(url):
                 self.log("Detected streaming site - using yt-dlp")
-                download_id = hashlib.md5(url.encode()).hexdigest()[:12]
+                download_id = hashlib.blake2b(url.encode(), digest_size=6).hexdigest()
                 self.active_downloads[download_id] = 'streaming'
                 self.send_message({'event': 'started', 'id': download_id})
 
@@ -291,14 +383,10 @@ class NativeMessagingHost:
                 # Handle different commands
                 command = message.get('command')
 
-                if command == 'download':
-                    self.handle_download_command(message)
-                elif command == 'pause':
-                    self.handle_pause_command(message)
-                elif command == 'resume':
-                    self.handle_resume_command(message)
-                elif command == 'cancel':
-                    self.handle_cancel_command(message)
+                # Non-string commands (e.g. a list) are unhashable, not just unknown
+                handler = self._handlers.get(command) if isinstance(command, str) else None
+                if handler is not None:
+                    handler(message)
                 else:
                     self.log(f"Unknown command: {command}")
                     self.send_message({
@@ -313,6 +401,12 @@ class NativeMessagingHost:
         finally:
             self.log("MyDM Native Host Stopped")
             self.running = False
+            self.download_manager.close()
+            # Let events that are already queued reach the extension
+            self.out_queue.put(None)
+            self._emitter.join(timeout=5)
+            if self._log_file is not None:
+                self._log_file.close()
 
 
 def main():
@@ -323,9 +417,8 @@ def main():
     except Exception as e:
         # Log the error
         try:
-            log_file = Path.home() / 'AppData' / 'Local' / 'MyDM' / 'host.log'
-            log_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(log_file, 'a', encoding='utf-8') as f:
+            LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(LOG_FILE, 'a', encoding='utf-8') as f:
                 timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
                 f.write(f"[{timestamp}] [FATAL] {str(e)}\n")
         except: